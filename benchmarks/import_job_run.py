@@ -0,0 +1,96 @@
+"""
+Memory held by a full ImportJob.run over a FileRecordStore, with the
+service's result events recorded on a ServiceJob, comparing a DedupState
+that claims every file with one that was planned from the store first.
+
+    python benchmarks/import_job_run.py [count ...]
+
+Paths are synthetic and nothing is copied: processing only claims and
+finishes each file, so what is measured is the job's own bookkeeping.
+Sizes repeat often, as they do for photos from one camera, and one file
+in DUPLICATE_EVERY is a second copy of an earlier file.
+"""
+import os
+import sys
+import time
+import tracemalloc
+import types
+
+# Import src/utils as a package without running its __init__, which needs the Windows-only
+# drive manager dependencies
+UTILS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'utils')
+sys.modules['utils'] = types.ModuleType('utils')
+sys.modules['utils'].__path__ = [UTILS_DIR]
+from utils.file_records import FileRecordStore  # noqa: E402
+from utils.import_job import ImportJob, DedupState  # noqa: E402
+from utils.ingest_service import ServiceJob  # noqa: E402
+
+FILES_PER_FOLDER = 500
+DUPLICATE_EVERY = 1000
+
+
+class DryRunDedup(DedupState):
+    def file_digest(self, filepath):
+        # Same name and size means same content here, the files don't exist
+        return os.path.basename(filepath)
+
+
+class DryRunJob(ImportJob):
+    def __init__(self, store, planned):
+        super().__init__('dest', photo_handler=None, dedup=DryRunDedup())
+        self.store = store
+        if planned:
+            self.dedup.plan(store)
+
+    def process_photo(self, src_path, tag=None):
+        ticket = self.dedup.claim(src_path, 'photo', self.store.sizes[tag])
+        if ticket is False:
+            return ('duplicate', src_path, tag)
+        self.dedup.finish(ticket, True)
+        return ('copied', src_path, tag)
+
+
+def build_store(count):
+    store = FileRecordStore()
+    for i in range(count):
+        folder = os.path.join('E:\\DCIM', f'{100 + i // FILES_PER_FOLDER}CANON')
+        n = i - DUPLICATE_EVERY // 2 if i % DUPLICATE_EVERY == DUPLICATE_EVERY - 1 else i
+        store.add(os.path.join(folder, f'IMG_{n:07d}.JPG'), 'photo',
+                  4_500_000 + (n * 7919) % 100_000, 1700000000.0 + n)
+    return store
+
+
+def measure(store, planned):
+    service_job = ServiceJob(1, 'dest')
+
+    def on_result(result):
+        status, src_path, index = result
+        store.set_status(index, status)
+        service_job.add_event({'type': 'result', 'status': status, 'path': src_path,
+                               'files_done': index + 1, 'files_total': len(store)})
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    job = DryRunJob(store, planned)
+    job.run(store, on_result)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    claims = sum(len(claims) for claims in job.dedup._claims.values())
+    return peak, elapsed, claims, store.counts()['duplicate']
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [200_000, 1_000_000]
+    print(f"{'files':>10} {'dedup':>8} {'peak MB':>10} {'bytes/file':>11} {'claims':>9} "
+          f"{'duplicates':>11} {'seconds':>8}")
+    for count in counts:
+        for name, planned in (('claims', False), ('planned', True)):
+            store = build_store(count)
+            peak, elapsed, claims, duplicates = measure(store, planned)
+            print(f"{count:>10} {name:>8} {peak / 2**20:>10.1f} {peak / count:>11.1f} {claims:>9} "
+                  f"{duplicates:>11} {elapsed:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Memory used to hold the files of a job, comparing FileRecordStore with the
+old lists of (path, tree_item) tuples.
+
+    python benchmarks/record_store_memory.py [count ...]
+
+Paths are synthetic (one folder per 500 files) so no files are touched.
+"""
+import os
+import sys
+import time
+import tracemalloc
+import types
+
+# Import src/utils as a package without running its __init__, which needs the Windows-only
+# drive manager dependencies
+UTILS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'utils')
+sys.modules['utils'] = types.ModuleType('utils')
+sys.modules['utils'].__path__ = [UTILS_DIR]
+from utils.file_records import FileRecordStore  # noqa: E402
+
+FILES_PER_FOLDER = 500
+
+
+def synthetic_files(count):
+    for i in range(count):
+        folder = os.path.join('E:\\DCIM', f'{100 + i // FILES_PER_FOLDER}CANON')
+        yield os.path.join(folder, f'IMG_{i:07d}.JPG'), 4_500_000 + i, 1700000000.0 + i
+
+
+def measure(build, count):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(count)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak, elapsed
+
+
+def build_store(count):
+    store = FileRecordStore()
+    for path, size, mtime in synthetic_files(count):
+        store.add(path, 'photo', size, mtime)
+    return store
+
+
+def build_tuples(count):
+    # Before: one tuple per file, plus a tree item id string standing in for the Treeview node
+    photos = []
+    for i, (path, _, _) in enumerate(synthetic_files(count)):
+        photos.append((path, f'I{i:06X}'))
+    return photos
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [1_000_000, 5_000_000]
+    print(f"{'files':>10} {'layout':>16} {'peak MB':>10} {'bytes/file':>11} {'seconds':>8}")
+    for count in counts:
+        for name, build in (('FileRecordStore', build_store), ('list of tuples', build_tuples)):
+            peak, elapsed = measure(build, count)
+            print(f"{count:>10} {name:>16} {peak / 2**20:>10.1f} {peak / count:>11.1f} {elapsed:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,20 @@ from tkinter import ttk
 from tkinter import messagebox, simpledialog
 from src.utils.drive_manager import DriveManager
 from src.utils.photo_operations import PhotoHandler
+from src.utils.copy_scheduler import format_bytes
+from src.utils.import_job import ImportJob
+from src.utils.file_records import FileRecordStore
+from src.utils.ingest_service import IngestClient
+from src.utils.directory_lister import DirectoryLister
 import os
-import shutil
+import queue
 import threading
 import concurrent.futures
 from functools import partial
 
+# Rows shown per folder before a "Show more" row, and rows inserted per Tk tick
+PAGE_SIZE = 1000
+CHUNK_SIZE = 200
 
 
 class PhotoMoverApp:
@@ -26,6 +34,13 @@ class PhotoMoverApp:
         self.drive_manager = DriveManager()
         self.photo_handler = PhotoHandler()
         self.processing = False
+        self.current_job = None
+        self.watcher = None
+        self.source_items = {}
+        self.lister = DirectoryLister()
+        self._ui_queue = queue.Queue()
+        self._listings = {}
+        self._more_rows = {}
         self.current_file = tk.StringVar()
         self.progress_var = tk.DoubleVar()
 
@@ -37,6 +52,11 @@ class PhotoMoverApp:
         # Bind events
         self.source_tree.bind('<<TreeviewOpen>>', self._on_tree_expand)
         self.dest_tree.bind('<<TreeviewOpen>>', self._on_tree_expand)
+        self.source_tree.bind('<<TreeviewSelect>>', self._on_tree_select)
+        self.dest_tree.bind('<<TreeviewSelect>>', self._on_tree_select)
+
+        # Background threads hand their results to the Tk thread through this queue
+        self.root.after(50, self._drain_ui_queue)
 
         # Schedule drive population
         self.root.after(100, self._delayed_init)
@@ -49,6 +69,7 @@ class PhotoMoverApp:
             'renamed': '#FFFF99',  # light yellow
             'pending': '#FFA07A',  # salmon
             'duplicate': '#ADD8E6',  # light blue
+            'error': '#FFA07A',  # salmon
             'default': ''  # default background
         }
 
@@ -66,6 +87,8 @@ class PhotoMoverApp:
                                   command=self.move_selected)
         self.stop_btn = ttk.Button(self.processing_frame, text="Stop Processing",
                                   command=self.stop_processing, state='disabled')
+        self.watch_btn = ttk.Button(self.processing_frame, text="Watch Folder",
+                                   command=self.toggle_watch)
         self.current_file_label = ttk.Label(self.processing_frame, textvariable=self.current_file)
         self.progress_bar = ttk.Progressbar(self.processing_frame, variable=self.progress_var,
                                        maximum=100, mode='determinate')
@@ -113,6 +136,7 @@ class PhotoMoverApp:
         self.processing_frame.pack(fill=tk.X, pady=(0, 10))
         self.move_btn.pack(side=tk.LEFT, padx=5)
         self.stop_btn.pack(side=tk.LEFT, padx=5)
+        self.watch_btn.pack(side=tk.LEFT, padx=5)
         self.current_file_label.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         self.progress_bar.pack(side=tk.RIGHT, fill=tk.X, expand=True, padx=5)
 
@@ -159,6 +183,8 @@ class PhotoMoverApp:
     def refresh_drive_contents(self, drive_path=None):
         """Refresh the contents of the selected drive"""
         self.source_tree.delete(*self.source_tree.get_children())
+        self.source_items.clear()
+        self.lister.clear_cache()
 
         if drive_path is None:
             selected = self.drive_var.get()
@@ -171,53 +197,135 @@ class PhotoMoverApp:
         except Exception as e:
             messagebox.showerror("Error", f"Error accessing drive {drive_path}: {str(e)}")
 
-    def _populate_tree(self, tree, path, parent=''):
-        """Recursively populate tree with folder structure"""
-        try:
-            for entry in os.scandir(path):
-                try:
-                    if entry.name.startswith('$') or entry.name.startswith('.'):
-                        continue
-
-                    if entry.is_dir():
-                        item_id = tree.insert(parent, 'end', text=entry.name, values=(entry.path,))
-
-                        has_contents = False
-                        try:
-                            next(os.scandir(entry.path))
-                            has_contents = True
-                        except StopIteration:
-                            pass
-                        except PermissionError:
-                            pass
-
-                        if has_contents:
-                            tree.insert(item_id, 'end')
-                    elif entry.is_file():
-                        tree.insert(parent, 'end', text=entry.name, values=(entry.path,))
-
-                except PermissionError:
-                    continue
-
-        except PermissionError:
-            pass
-        except Exception as e:
-            print(f"Error accessing {path}: {str(e)}")
+    def _drain_ui_queue(self):
+        """Run callbacks queued by background threads on the Tk thread"""
+        while True:
+            try:
+                callback = self._ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error updating window: {str(e)}")
+        self.root.after(50, self._drain_ui_queue)
+
+    def _populate_tree(self, tree, path, parent='', stored_tags=None):
+        """List path on a background thread and fill the tree in chunks"""
+        token = object()
+        self._prune_listings(tree)
+        self._listings[(str(tree), parent)] = token
+        self._more_rows = {item: more for item, more in self._more_rows.items()
+                           if not (more[0] is tree and more[1] == parent)}
+        loading = tree.insert(parent, 'end', text="Loading...")
+
+        def on_listed(dirs, files, error):
+            self._ui_queue.put(partial(self._show_listing, tree, path, parent, token, loading,
+                                       dirs, files, error, stored_tags or {}))
+
+        self.lister.list(path, on_listed)
+
+    def _prune_listings(self, tree):
+        """Forget listings and "Show more" rows of tree items that were removed"""
+        name = str(tree)
+        self._listings = {key: token for key, token in self._listings.items()
+                          if key[0] != name or not key[1] or tree.exists(key[1])}
+        self._more_rows = {item: more for item, more in self._more_rows.items()
+                           if more[0] is not tree or tree.exists(item)}
+
+    def _is_current(self, tree, parent, token):
+        """False once the listing was replaced or its parent removed"""
+        return (self._listings.get((str(tree), parent)) is token
+                and (not parent or tree.exists(parent)))
+
+    def _show_listing(self, tree, path, parent, token, loading, dirs, files, error, stored_tags):
+        if not self._is_current(tree, parent, token):
+            return
+        if tree.exists(loading):
+            tree.delete(loading)
+        if error:
+            print(f"Error accessing {path}: {str(error)}")
+
+        rows = [(name, entry_path, True) for name, entry_path in dirs]
+        rows += [(name, entry_path, False) for name, entry_path in files]
+        self._insert_page(tree, parent, token, rows, stored_tags)
+
+    def _insert_page(self, tree, parent, token, rows, stored_tags, more_item=None):
+        """Insert up to PAGE_SIZE rows, leaving a "Show more" row for the rest"""
+        if more_item and tree.exists(more_item):
+            tree.delete(more_item)
+        page, rest = rows[:PAGE_SIZE], rows[PAGE_SIZE:]
+        self._insert_chunk(tree, parent, token, page, rest, stored_tags, [])
+
+    def _insert_chunk(self, tree, parent, token, page, rest, stored_tags, dir_items):
+        """Insert CHUNK_SIZE rows per Tk tick so big folders don't freeze the window"""
+        if not self._is_current(tree, parent, token):
+            return
+
+        for name, entry_path, is_dir in page[:CHUNK_SIZE]:
+            item_id = tree.insert(parent, 'end', text=name, values=(entry_path,),
+                                  tags=stored_tags.get(entry_path, ()))
+            if tree is self.source_tree:
+                self.source_items[entry_path] = item_id
+            if is_dir:
+                # Assume the folder has contents, the probe below removes the expander if not
+                tree.insert(item_id, 'end')
+                dir_items.append((entry_path, item_id))
+
+        if len(page) > CHUNK_SIZE:
+            self.root.after(1, self._insert_chunk, tree, parent, token, page[CHUNK_SIZE:],
+                            rest, stored_tags, dir_items)
+            return
+
+        if rest:
+            more_item = tree.insert(parent, 'end',
+                                    text=f"Show more... ({len(rest)} more items)")
+            self._more_rows[more_item] = (tree, parent, token, rest, stored_tags)
+
+        if dir_items:
+            items = dict(dir_items)
+
+            def on_probed(empty_paths):
+                self._ui_queue.put(partial(self._remove_expanders, tree, parent, token,
+                                           [items[path] for path in empty_paths]))
+
+            self.lister.probe([path for path, _ in dir_items], on_probed)
+
+    def _remove_expanders(self, tree, parent, token, items):
+        """Drop the placeholder child of folders that turned out to be empty"""
+        if not self._is_current(tree, parent, token):
+            return
+        for item in items:
+            if tree.exists(item):
+                children = tree.get_children(item)
+                if len(children) == 1 and not tree.item(children[0], 'text'):
+                    tree.delete(*children)
+
+    def _on_tree_select(self, event):
+        """Load the next page when a "Show more" row is selected"""
+        tree = event.widget
+        for item in tree.selection():
+            more = self._more_rows.pop(item, None)
+            if more:
+                more_tree, parent, token, rest, stored_tags = more
+                if self._is_current(more_tree, parent, token):
+                    self._insert_page(more_tree, parent, token, rest, stored_tags, item)
+
+    def _item_path(self, tree, item):
+        """Path of a tree item, empty for placeholder, loading and "Show more" rows"""
+        values = tree.item(item)['values']
+        return values[0] if values else ''
 
     def _store_item_tags(self, tree, item):
-        """Store the tags of an item and its children"""
+        """Store the tags of an item's children by path"""
         tags = {}
-        tags[item] = tree.item(item)['tags']
         for child in tree.get_children(item):
+            values = tree.item(child)['values']
+            if values and tree.item(child)['tags']:
+                tags[values[0]] = tree.item(child)['tags']
             tags.update(self._store_item_tags(tree, child))
         return tags
 
-    def _restore_item_tags(self, tree, tags):
-        """Restore the tags of items"""
-        for item, item_tags in tags.items():
-            if item_tags:
-                tree.item(item, tags=item_tags)
-
     def _on_tree_expand(self, event):
         """Handle tree node expansion"""
         tree = event.widget
@@ -257,11 +365,7 @@ class PhotoMoverApp:
             try:
                 path = tree.item(item)['values'][0]
                 if path:
-                    self._populate_tree(tree, path, item)
-
-                # Restore tags only if item still exists
-                if tree.exists(item):
-                    self._restore_item_tags(tree, stored_tags)
+                    self._populate_tree(tree, path, item, stored_tags)
             except (tk.TclError, IndexError):
                 pass
 
@@ -272,6 +376,8 @@ class PhotoMoverApp:
     def refresh_dest_folders(self):
         """Refresh the destination folders tree"""
         self.dest_tree.delete(*self.dest_tree.get_children())
+        self._prune_listings(self.dest_tree)
+        self.lister.clear_cache()
 
         available_drives = self.drive_manager.get_available_drives()
         special_folders = self.drive_manager.get_special_folders()
@@ -295,12 +401,11 @@ class PhotoMoverApp:
     def create_new_folder(self):
         """Create a new folder in the selected destination"""
         selected = self.dest_tree.selection()
-        if not selected:
+        parent_path = self._item_path(self.dest_tree, selected[0]) if selected else ''
+        if not parent_path:
             messagebox.showwarning("No Selection", "Please select a parent folder")
             return
 
-        parent_path = self.dest_tree.item(selected[0])['values'][0]
-
         folder_name = simpledialog.askstring("New Folder", "Enter folder name:")
         if not folder_name:
             return
@@ -348,224 +453,207 @@ class PhotoMoverApp:
         elif has_renamed:
             self.update_item_color(self.source_tree, folder_item, 'renamed')
 
-    def update_progress(self, current_file, processed_count, total_files, current_item):
+    def update_byte_progress(self, bytes_done, bytes_total):
+        """Move the progress bar while large files copy, between per-file updates"""
+        if bytes_total:
+            self.progress_var.set((bytes_done / bytes_total) * 100)
+
+    def update_progress(self, current_file, processed_count, total_files, current_item,
+                        bytes_done=0, bytes_total=0):
         """Update progress bar, current file label and scroll to current item"""
-        self.current_file.set(f"Processing: {os.path.basename(current_file)}")
-        self.progress_var.set((processed_count / total_files) * 100)
+        self.current_file.set(f"Processing: {os.path.basename(current_file)} "
+                              f"({processed_count}/{total_files} files, "
+                              f"{format_bytes(bytes_done)} of {format_bytes(bytes_total)})")
+        if bytes_total:
+            self.progress_var.set((bytes_done / bytes_total) * 100)
+        else:
+            self.progress_var.set((processed_count / total_files) * 100)
         if current_item:
             self.scroll_to_item(self.source_tree, current_item)
-        self.root.update()
 
     def scroll_to_item(self, tree, item):
         """Ensure the specified item is visible in the tree"""
         tree.see(item)
-        self.root.update()
+
+    def _show_result(self, src_path, status, processed_count, total_files, bytes_done, bytes_total):
+        """Colour a processed file and move the progress display, on the Tk thread"""
+        tree_item = self._source_item(src_path)
+        if tree_item:
+            self.update_item_color(self.source_tree, tree_item, status)
+        self.update_progress(src_path, processed_count, total_files, tree_item, bytes_done, bytes_total)
 
     def stop_processing(self):
         """Stop the processing of files"""
         self.processing = False
+        if self.current_job:
+            self.current_job.cancel()
         self.stop_btn.configure(state='disabled')
         self.move_btn.configure(state='normal')
 
-    def get_unique_filename(self, filepath):
-        """Generate unique filename if file exists"""
-        directory = os.path.dirname(filepath)
-        filename = os.path.basename(filepath)
-        name, ext = os.path.splitext(filename)
+    def toggle_watch(self):
+        """Start or stop sorting new files as they appear in the selected source folder"""
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+            self.watch_job.cancel()
+            self.watch_job.scheduler.shutdown(wait=False)
+            self.watch_btn.configure(text="Watch Folder")
+            self.move_btn.configure(state='normal')
+            self.current_file.set("Stopped watching")
+            return
 
-        counter = 0
-        while os.path.exists(filepath):
-            counter += 1
-            new_filename = f"{name}_{counter}{ext}"
-            filepath = os.path.join(directory, new_filename)
+        selected_items = self.source_tree.selection()
+        if not selected_items or not os.path.isdir(self._item_path(self.source_tree, selected_items[0])):
+            messagebox.showwarning("No Selection", "Please select a source folder")
+            return
+        dest_selection = self.dest_tree.selection()
+        if not dest_selection or not self._item_path(self.dest_tree, dest_selection[0]):
+            messagebox.showwarning("No Destination", "Please select a destination folder")
+            return
 
-        return filepath
+        source_path = self._item_path(self.source_tree, selected_items[0])
+        base_dest_path = self._item_path(self.dest_tree, dest_selection[0])
+        sorted_count = 0
+
+        def on_result(result):
+            nonlocal sorted_count
+            status, src_path, _ = result
+            sorted_count += 1
+            # Results arrive on worker threads, update the window from the Tk thread
+            self._ui_queue.put(partial(self.current_file.set,
+                                       f"Watching: {os.path.basename(src_path)} {status} ({sorted_count} files)"))
+
+        self.watch_job = ImportJob(base_dest_path, self.photo_handler)
+        self.watcher = self.watch_job.watch(source_path, on_result)
+        self.watch_btn.configure(text="Stop Watching")
+        self.move_btn.configure(state='disabled')
+        self.current_file.set(f"Watching {source_path}")
 
     def move_selected(self):
         """Start processing files"""
-        threading.Thread(target=self.process_files, daemon=True).start()
+        self.process_files()
 
     def _delayed_init(self):
         """Initialize after main window is created"""
         self.refresh_drive_list()
         self.refresh_dest_folders()
 
+    def _process_with_service(self, client, base_dest_path, sources):
+        """Run the job in the background service and follow its progress events"""
+        job = client.submit_job(base_dest_path, [path for _, path in sources])
+        self.current_job = job
+
+        for event in job.events():
+            if event['type'] == 'result':
+                self._ui_queue.put(partial(self._show_result, event['path'], event['status'],
+                                           event['files_done'], event['files_total'],
+                                           event['bytes_done'], event['bytes_total']))
+            elif event['type'] == 'progress':
+                self._ui_queue.put(partial(self.update_byte_progress,
+                                           event['bytes_done'], event['bytes_total']))
+            elif event['type'] == 'error':
+                self._ui_queue.put(partial(messagebox.showerror, "Error", event['message']))
+
+        # Result events a slow reader missed were dropped by the service, colour from final statuses
+        statuses = []
+        for result in job.results():
+            statuses.append((result['path'], result['status']))
+            if len(statuses) >= CHUNK_SIZE:
+                self._ui_queue.put(partial(self._show_statuses, statuses))
+                statuses = []
+        if statuses:
+            self._ui_queue.put(partial(self._show_statuses, statuses))
+
+    def _show_statuses(self, statuses):
+        """Colour a batch of (path, status) pairs, on the Tk thread"""
+        for path, status in statuses:
+            tree_item = self._source_item(path)
+            if tree_item:
+                self.update_item_color(self.source_tree, tree_item, status)
+
+    def _source_item(self, path):
+        """Tree item showing path, if that folder has been expanded"""
+        item = self.source_items.get(path)
+        if item and self.source_tree.exists(item):
+            return item
+        return None
+
     def process_files(self):
-        """Process files in a separate thread with parallel processing"""
+        """Check the selection, then process every selected source folder in a separate thread"""
         selected_items = self.source_tree.selection()
         if not selected_items:
             messagebox.showwarning("No Selection", "Please select a source folder")
             return
 
-        selected_item = selected_items[0]
-        source_path = self.source_tree.item(selected_item)['values'][0]
-
-        if not os.path.isdir(source_path):
+        sources = [(item, self._item_path(self.source_tree, item)) for item in selected_items]
+        sources = [(item, path) for item, path in sources if path and os.path.isdir(path)]
+        if not sources:
             messagebox.showwarning("Invalid Selection", "Please select a folder")
             return
 
-        photos = []
-        movies = []
-        other_files = []
-
-        # Use ThreadPoolExecutor for parallel file collection
-        def collect_file(entry, current_tree_item):
-            if entry.name.startswith('$') or entry.name.startswith('.'):
-                return None
-
-            # Create tree item if it doesn't exist
-            entry_item = None
-            for child in self.source_tree.get_children(current_tree_item):
-                child_name = self.source_tree.item(child, 'text')
-                if child_name == entry.name:
-                    entry_item = child
-                    break
-
-            if not entry_item:
-                entry_item = self.source_tree.insert(current_tree_item, 'end',
-                                                     text=entry.name,
-                                                     values=(entry.path,))
-
-            if entry.is_file():
-                if self.photo_handler.is_image_file(entry.name):
-                    return ('photo', entry.path, entry_item)
-                elif self.photo_handler.is_movie_file(entry.name):
-                    return ('movie', entry.path, entry_item)
-                else:
-                    return ('other', entry.path, entry_item)
-            return None
-
-        def collect_files_parallel(folder_path, current_tree_item):
-            try:
-                with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-                    entries = list(os.scandir(folder_path))
-                    collect_func = partial(collect_file, current_tree_item=current_tree_item)
-                    results = list(executor.map(collect_func, entries))
-
-                    for result in results:
-                        if result:
-                            file_type, path, item = result
-                            if file_type == 'photo':
-                                photos.append((path, item))
-                            elif file_type == 'movie':
-                                movies.append((path, item))
-                            else:
-                                other_files.append((path, item))
-
-                    # Process subdirectories
-                    subdirs = [entry for entry in entries if entry.is_dir()]
-                    for subdir in subdirs:
-                        try:
-                            collect_files_parallel(subdir.path,
-                                                   self.source_tree.insert(current_tree_item, 'end',
-                                                                           text=subdir.name,
-                                                                           values=(subdir.path,)))
-                        except PermissionError:
-                            continue
-
-            except PermissionError:
-                messagebox.showerror("Error", f"Access denied to {folder_path}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error accessing {folder_path}: {str(e)}")
-
-        collect_files_parallel(source_path, selected_item)
-
-        if not (photos or movies or other_files):
-            messagebox.showwarning("No Files", "No files found to process")
-            return
+        # Drop folders nested inside another selected folder
+        roots = [os.path.join(path, '') for _, path in sources]
+        sources = [(item, path) for item, path in sources
+                   if not any(path != root[:-1] and path.startswith(root) for root in roots)]
 
         dest_selection = self.dest_tree.selection()
-        if not dest_selection:
+        if not dest_selection or not self._item_path(self.dest_tree, dest_selection[0]):
             messagebox.showwarning("No Destination", "Please select a destination folder")
             return
 
-        base_dest_path = self.dest_tree.item(dest_selection[0])['values'][0]
+        base_dest_path = self._item_path(self.dest_tree, dest_selection[0])
         self.progress_var.set(0)
-        total_files = len(photos) + len(movies) + len(other_files)
-        processed_count = 0
-
         self.processing = True
         self.move_btn.configure(state='disabled')
         self.stop_btn.configure(state='normal')
+        threading.Thread(target=self._process_sources, args=(sources, base_dest_path), daemon=True).start()
 
-        # Process files in parallel
-        def process_photo(args):
-            if not self.processing:
-                return None
-            src_path, tree_item = args
-            try:
-                photo_date = self.photo_handler.get_photo_date(src_path)
-                year_folder = str(photo_date.year)
-                month_folder = f"{photo_date.month:02d}"
-                year_path = os.path.join(base_dest_path, year_folder)
-                month_path = os.path.join(year_path, month_folder)
-
-                os.makedirs(year_path, exist_ok=True)
-                os.makedirs(month_path, exist_ok=True)
-
-                src_filename = os.path.basename(src_path)
-                dest_file = os.path.join(month_path, src_filename)
-
-                if os.path.exists(dest_file):
-                    if src_filename == os.path.basename(dest_file) and self.photo_handler.are_images_same(src_path,
-                                                                                                          dest_file):
-                        return ('duplicate', src_path, tree_item)
-                    elif self.photo_handler.are_images_same(src_path, dest_file):
-                        return ('copied', src_path, tree_item)
-                    else:
-                        dest_file = self.get_unique_filename(dest_file)
-                        shutil.copy2(src_path, dest_file)
-                        return ('renamed', src_path, tree_item)
-
-                shutil.copy2(src_path, dest_file)
-                return ('copied', src_path, tree_item)
-            except Exception as e:
-                return ('error', src_path, tree_item)
-
-        def process_other_file(args, folder_name):
-            if not self.processing:
-                return None
-            src_path, tree_item = args
-            try:
-                dest_folder = os.path.join(base_dest_path, folder_name)
-                os.makedirs(dest_folder, exist_ok=True)
-                dest_file = os.path.join(dest_folder, os.path.basename(src_path))
-
-                if os.path.exists(dest_file):
-                    dest_file = self.get_unique_filename(dest_file)
-                    shutil.copy2(src_path, dest_file)
-                    return ('renamed', src_path, tree_item)
-
-                shutil.copy2(src_path, dest_file)
-                return ('copied', src_path, tree_item)
-            except Exception as e:
-                return ('error', src_path, tree_item)
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-            # Process photos
-            photo_futures = [executor.submit(process_photo, photo) for photo in photos]
-
-            # Process movies and other files
-            movie_futures = [executor.submit(process_other_file, movie, "Movies")
-                             for movie in movies]
-            other_futures = [executor.submit(process_other_file, other, "Other")
-                             for other in other_files]
-
-            all_futures = photo_futures + movie_futures + other_futures
-
-            for future in concurrent.futures.as_completed(all_futures):
-                if not self.processing:
-                    executor.shutdown(wait=False)
-                    break
-
-                result = future.result()
-                if result:
-                    status, src_path, tree_item = result
-                    self.update_item_color(self.source_tree, tree_item, status)
+    def _process_sources(self, sources, base_dest_path):
+        """Worker thread of process_files, every window update goes through _ui_queue"""
+        processed_count = 0
+        client = IngestClient()
+        try:
+            if client.is_running():
+                self._process_with_service(client, base_dest_path, sources)
+            else:
+                # One job for all sources, sharing the copy lanes and duplicate state
+                job = ImportJob(base_dest_path, self.photo_handler)
+                for _, source_path in sources:
+                    job.add_source(source_path)
+                self.current_job = job
+
+                # Scan all sources at the same time into one compact record store
+                store = FileRecordStore()
+                self._ui_queue.put(partial(self.current_file.set, "Scanning source folders..."))
+                with concurrent.futures.ThreadPoolExecutor(max_workers=len(sources)) as executor:
+                    list(executor.map(lambda source: job.collect_source(source[1], store), sources))
+
+                if not len(store):
+                    self._ui_queue.put(partial(messagebox.showwarning, "No Files", "No files found to process"))
+                    return
+                job.dedup.plan(store)
+
+                def on_result(result):
+                    nonlocal processed_count
+                    status, src_path, index = result
+                    store.set_status(index, status)
                     processed_count += 1
-                    self.update_progress(src_path, processed_count, total_files, tree_item)
-
-        self.update_folder_status(selected_item)
+                    self._ui_queue.put(partial(self._show_result, src_path, status, processed_count,
+                                               len(store), job.scheduler.progress()[2], store.total_bytes))
+
+                def on_progress():
+                    self._ui_queue.put(partial(self.update_byte_progress,
+                                               job.scheduler.progress()[2], store.total_bytes))
+
+                job.run(store, on_result, on_progress=on_progress)
+        finally:
+            self.current_job = None
+            self._ui_queue.put(partial(self._finish_processing, sources))
+
+    def _finish_processing(self, sources):
+        """Reset the controls after processing finished or was stopped"""
+        for selected_item, _ in sources:
+            self.update_folder_status(selected_item)
         self.current_file.set("Processing complete" if self.processing else "Processing stopped")
         self.stop_btn.configure(state='disabled')
         self.move_btn.configure(state='normal')
@@ -1,10 +1,89 @@
+import argparse
+import time
 import tkinter as tk
 from gui.main_window import PhotoMoverApp
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sort photos and videos into dated folders")
+    parser.add_argument('--serve', action='store_true',
+                        help="run the background import service")
+    parser.add_argument('--import', dest='sources', nargs='+', metavar='SOURCE',
+                        help="import SOURCE folders without opening the window")
+    parser.add_argument('--watch', metavar='SOURCE',
+                        help="sort new files from SOURCE as they appear, until interrupted")
+    parser.add_argument('--dest', help="destination folder for --import and --watch")
+    parser.add_argument('--port', type=int, default=None, help="service port")
+    return parser.parse_args()
+
+
+def serve(port):
+    from src.utils.drive_manager import DriveManager
+    from src.utils.ingest_service import IngestService, DEFAULT_PORT
+
+    IngestService(drive_manager=DriveManager()).serve(port=port or DEFAULT_PORT)
+
+
+def run_import(sources, destination, port):
+    """Import through the service when it is running, otherwise in this process"""
+    from src.utils.ingest_service import IngestClient, DEFAULT_PORT
+
+    client = IngestClient(port=port or DEFAULT_PORT)
+    if client.is_running():
+        job_id = client.submit(destination, sources)
+        events = client.events(job_id)
+    else:
+        from src.utils.ingest_service import IngestService
+        service = IngestService()
+        job = service.submit(destination, sources)
+        events = job.iter_events()
+
+    for event in events:
+        if event['type'] == 'result':
+            print(f"[{event['files_done']}/{event['files_total']}] {event['status']}: {event['path']}")
+        elif event['type'] == 'error':
+            print(f"Error: {event['message']}")
+        elif event['type'] == 'done':
+            print(f"Import {event['state']}")
+
+
+def watch(source, destination):
+    from src.utils.import_job import ImportJob
+    from src.utils.photo_operations import PhotoHandler
+
+    def on_result(result):
+        status, src_path, _ = result
+        print(f"{status}: {src_path}")
+
+    job = ImportJob(destination, PhotoHandler())
+    watcher = job.watch(source, on_result)
+    print(f"Watching {source} ({'inotify' if watcher.uses_inotify else 'polling'}), press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        watcher.stop()
+        job.scheduler.shutdown()
+
+
 def main():
+    args = parse_args()
+    if args.serve:
+        serve(args.port)
+        return
+    if (args.sources or args.watch) and not args.dest:
+        print("--dest is required with --import and --watch")
+        return
+    if args.sources:
+        run_import(args.sources, args.dest, args.port)
+        return
+    if args.watch:
+        watch(args.watch, args.dest)
+        return
+
     root = tk.Tk()
     app = PhotoMoverApp(root)
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,178 @@
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Page cache hints are only available on POSIX platforms
+_FADV_SEQUENTIAL = getattr(os, 'POSIX_FADV_SEQUENTIAL', None)
+_FADV_DONTNEED = getattr(os, 'POSIX_FADV_DONTNEED', None)
+
+
+class BandwidthLimiter:
+    """Token bucket shared by all workers of a lane"""
+
+    def __init__(self, bytes_per_second=None):
+        self.bytes_per_second = bytes_per_second
+        self._allowance = bytes_per_second or 0
+        self._last_check = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes):
+        """Block until nbytes may be transferred"""
+        if not self.bytes_per_second:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.bytes_per_second,
+                                  self._allowance + (now - self._last_check) * self.bytes_per_second)
+            self._last_check = now
+            self._allowance -= nbytes
+            delay = -self._allowance / self.bytes_per_second if self._allowance < 0 else 0
+
+        if delay:
+            time.sleep(delay)
+
+
+class _Lane:
+    """Worker pool and bandwidth limit for one class of file sizes"""
+
+    def __init__(self, name, max_workers, bytes_per_second):
+        self.name = name
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix=f"copy-{name}")
+        self.limiter = BandwidthLimiter(bytes_per_second)
+
+
+class CopyScheduler:
+    """
+    Schedules file tasks into separate lanes for small and large files so a
+    few multi-GB movies can't hold every worker while photos wait.
+    Large files are streamed in chunks with page cache hints where the
+    platform supports them. Progress is tracked in bytes as well as files.
+    """
+
+    def __init__(self, large_file_threshold=64 * 1024 * 1024,
+                 small_workers=4, large_workers=1,
+                 small_bandwidth=None, large_bandwidth=None,
+                 chunk_size=8 * 1024 * 1024):
+        self.large_file_threshold = large_file_threshold
+        self.chunk_size = chunk_size
+        self.small_lane = _Lane('small', small_workers, small_bandwidth)
+        self.large_lane = _Lane('large', large_workers, large_bandwidth)
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.files_total = 0
+        self.files_done = 0
+
+    def lane_for(self, size):
+        """Lane that files of size bytes are copied in"""
+        return self.large_lane if size >= self.large_file_threshold else self.small_lane
+
+    def submit(self, func, src_path, *args, size=None, **kwargs):
+        """
+        Submit func(src_path, *args) to the lane matching the size of
+        src_path. Pass size when it is already known to skip the stat.
+        """
+        if size is None:
+            try:
+                size = os.path.getsize(src_path)
+            except OSError:
+                size = 0
+
+        with self._lock:
+            self.bytes_total += size
+            self.files_total += 1
+
+        lane = self.lane_for(size)
+        future = lane.executor.submit(self._run_task, lane, size, func, src_path, *args, **kwargs)
+        future.lane = lane
+        return future
+
+    def _run_task(self, lane, size, func, src_path, *args, **kwargs):
+        self._local.lane = lane
+        self._local.copied = 0
+        try:
+            return func(src_path, *args, **kwargs)
+        finally:
+            # Files that were skipped, deduplicated or failed still count as done
+            with self._lock:
+                self.bytes_done += max(size - self._local.copied, 0)
+                self.files_done += 1
+            self._local.lane = None
+
+    def current_lane(self):
+        """Lane of the task running on this thread, None outside a task"""
+        return getattr(self._local, 'lane', None)
+
+    def _add_copied(self, nbytes):
+        with self._lock:
+            self.bytes_done += nbytes
+        if getattr(self._local, 'lane', None) is not None:
+            self._local.copied += nbytes
+
+    def copy_file(self, src_path, dest_path):
+        """Copy a file with metadata, streaming large files in chunks"""
+        size = os.path.getsize(src_path)
+        lane = getattr(self._local, 'lane', None) or self.lane_for(size)
+
+        if size < self.large_file_threshold and not lane.limiter.bytes_per_second:
+            shutil.copy2(src_path, dest_path)
+            self._add_copied(size)
+            return
+
+        self._stream_copy(src_path, dest_path, lane.limiter)
+        shutil.copystat(src_path, dest_path)
+
+    def _stream_copy(self, src_path, dest_path, limiter):
+        """Chunked copy that keeps large files from evicting useful page cache"""
+        with open(src_path, 'rb') as src, open(dest_path, 'wb') as dest:
+            _fadvise(src, _FADV_SEQUENTIAL)
+            offset = 0
+            while True:
+                chunk = src.read(self.chunk_size)
+                if not chunk:
+                    break
+                limiter.consume(len(chunk))
+                dest.write(chunk)
+
+                # Pages already read won't be needed again
+                _fadvise(src, _FADV_DONTNEED, offset, len(chunk))
+                offset += len(chunk)
+                self._add_copied(len(chunk))
+
+            dest.flush()
+            # Only clean pages are dropped, so this mostly affects data already written back
+            _fadvise(dest, _FADV_DONTNEED)
+
+    def progress(self):
+        """Return (files_done, files_total, bytes_done, bytes_total)"""
+        with self._lock:
+            return self.files_done, self.files_total, self.bytes_done, self.bytes_total
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.small_lane.executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+        self.large_lane.executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def _fadvise(fileobj, advice, offset=0, length=0):
+    """posix_fadvise when available (not on Windows)"""
+    if advice is None:
+        return
+    try:
+        os.posix_fadvise(fileobj.fileno(), offset, length, advice)
+    except OSError:
+        pass
+
+
+def format_bytes(size):
+    """Human readable byte count"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
@@ -0,0 +1,89 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DirectoryLister:
+    """
+    Lists folders on background threads so slow drives and network shares
+    never block the window. Whether a folder has children is probed on a
+    separate thread, so probes never delay the next listing, and cached by
+    folder modification time.
+    """
+
+    def __init__(self, max_workers=2, probe_workers=1, max_cached=20000):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lister")
+        self.probe_executor = ThreadPoolExecutor(max_workers=probe_workers, thread_name_prefix="prober")
+        self.max_cached = max_cached
+        self._children_cache = {}
+        self._lock = threading.Lock()
+
+    def _skip(self, name):
+        return name.startswith('$') or name.startswith('.')
+
+    def list(self, path, callback):
+        """Call callback(dirs, files, error) from a worker thread, each a list of (name, path)"""
+        def run():
+            dirs, files = [], []
+            try:
+                for entry in os.scandir(path):
+                    if self._skip(entry.name):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            dirs.append((entry.name, entry.path))
+                        elif entry.is_file():
+                            files.append((entry.name, entry.path))
+                    except OSError:
+                        continue
+            except PermissionError:
+                pass
+            except Exception as e:
+                callback(dirs, files, e)
+                return
+            callback(dirs, files, None)
+
+        return self.executor.submit(run)
+
+    def has_children(self, path):
+        """True if path contains any visible entry, cached until the folder changes"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return False
+
+        with self._lock:
+            cached = self._children_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        result = False
+        try:
+            with os.scandir(path) as entries:
+                result = any(not self._skip(entry.name) for entry in entries)
+        except OSError:
+            pass
+
+        with self._lock:
+            if len(self._children_cache) >= self.max_cached:
+                self._children_cache.clear()
+            self._children_cache[path] = (mtime, result)
+        return result
+
+    def clear_cache(self):
+        with self._lock:
+            self._children_cache.clear()
+
+    def probe(self, paths, callback, batch_size=200):
+        """Call callback(empty_paths) from a worker thread for each batch of folders probed"""
+        def run():
+            for start in range(0, len(paths), batch_size):
+                empty = [path for path in paths[start:start + batch_size] if not self.has_children(path)]
+                if empty:
+                    callback(empty)
+
+        return self.probe_executor.submit(run)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.probe_executor.shutdown(wait=False, cancel_futures=True)
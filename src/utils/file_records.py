@@ -0,0 +1,89 @@
+import os
+import threading
+from array import array
+
+
+class FileRecordStore:
+    """
+    Compact column store for the files of a job. Directory prefixes are
+    interned, basenames are packed into one byte buffer and size, mtime,
+    kind and status live in typed arrays, so a record costs tens of bytes
+    instead of a tuple, a path string and a tree node per file.
+    """
+
+    KINDS = ('photo', 'movie', 'other')
+    STATUSES = ('pending', 'copied', 'renamed', 'duplicate', 'error')
+
+    def __init__(self):
+        self._dirs = []
+        self._dir_ids = {}
+        self._names = bytearray()
+        self._name_ends = array('Q')
+        self.dir_ids = array('I')
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.kinds = bytearray()
+        self.statuses = bytearray()
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, path, kind, size=0, mtime=0.0):
+        """Append a file record and return its index"""
+        directory, name = os.path.split(path)
+        encoded = os.fsencode(name)
+        with self._lock:
+            dir_id = self._dir_ids.get(directory)
+            if dir_id is None:
+                dir_id = len(self._dirs)
+                self._dirs.append(directory)
+                self._dir_ids[directory] = dir_id
+            self._names += encoded
+            self._name_ends.append(len(self._names))
+            self.dir_ids.append(dir_id)
+            self.sizes.append(size)
+            self.mtimes.append(mtime)
+            self.kinds.append(self.KINDS.index(kind))
+            self.statuses.append(0)
+            self.total_bytes += size
+            return len(self.kinds) - 1
+
+    def add_entry(self, entry, kind):
+        """Append a record for an os.DirEntry, using its cached stat where possible"""
+        try:
+            stat = entry.stat()
+            return self.add(entry.path, kind, stat.st_size, stat.st_mtime)
+        except OSError:
+            return self.add(entry.path, kind)
+
+    def name(self, index):
+        start = self._name_ends[index - 1] if index else 0
+        return os.fsdecode(bytes(self._names[start:self._name_ends[index]]))
+
+    def directory(self, index):
+        return self._dirs[self.dir_ids[index]]
+
+    def path(self, index):
+        return os.path.join(self.directory(index), self.name(index))
+
+    def kind(self, index):
+        return self.KINDS[self.kinds[index]]
+
+    def status(self, index):
+        return self.STATUSES[self.statuses[index]]
+
+    def set_status(self, index, status):
+        self.statuses[index] = self.STATUSES.index(status)
+
+    def items(self, status='pending'):
+        """Yield (kind, path, index) for records with status, for ImportJob.run"""
+        code = self.STATUSES.index(status)
+        for index in range(len(self.kinds)):
+            if self.statuses[index] == code:
+                yield self.KINDS[self.kinds[index]], self.path(index), index
+
+    def counts(self):
+        """Number of records per status"""
+        return {status: self.statuses.count(code) for code, status in enumerate(self.STATUSES)}
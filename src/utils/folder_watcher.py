@@ -0,0 +1,275 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+
+_EVENT_HEADER = struct.Struct('iIII')
+_WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+               | IN_DELETE | IN_DELETE_SELF)
+
+
+def _load_inotify():
+    """Return libc if inotify is available, otherwise None"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+class FolderWatcher:
+    """
+    Watches a folder tree and calls callback(path) once for every new file
+    whose size has stopped changing. Uses inotify on Linux and falls back to
+    polling folder modification times elsewhere.
+    """
+
+    def __init__(self, path, callback, settle_time=1.0, poll_interval=1.0,
+                 use_inotify=True, process_existing=False):
+        self.path = path
+        self.callback = callback
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.process_existing = process_existing
+        self._libc = _load_inotify() if use_inotify else None
+        self._stop = threading.Event()
+        self._thread = None
+        self._pending = {}
+        self._writing = set()
+        # Names of files already handled, per folder, dropped once they are gone
+        self._seen = {}
+        self._dir_mtimes = {}
+        self._subdirs = {}
+
+    @property
+    def uses_inotify(self):
+        return self._libc is not None
+
+    def start(self):
+        self._stop.clear()
+        target = self._run_inotify if self._libc else self._run_polling
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _skip(self, name):
+        return name.startswith('$') or name.startswith('.')
+
+    def _scan(self, directory, only_changed=False):
+        """
+        Record files in directory and its subfolders as seen or pending.
+        With only_changed, folders whose mtime hasn't changed are not listed
+        again, their cached subfolder list is walked instead.
+        """
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            self._forget(directory)
+            return
+
+        if only_changed and self._dir_mtimes.get(directory) == mtime and directory in self._subdirs:
+            subdirs = self._subdirs[directory]
+        else:
+            self._dir_mtimes[directory] = mtime
+            subdirs = []
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                entries = []
+
+            names = set()
+            for entry in entries:
+                if self._skip(entry.name):
+                    continue
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        names.add(entry.name)
+                        self._found(entry.path)
+                except OSError:
+                    continue
+            seen = self._seen.get(directory)
+            if seen:
+                seen &= names
+                if not seen:
+                    del self._seen[directory]
+            for gone in set(self._subdirs.get(directory, ())) - set(subdirs):
+                self._forget(gone)
+            self._subdirs[directory] = subdirs
+
+        for subdir in subdirs:
+            self._scan(subdir, only_changed)
+
+    def _forget(self, directory):
+        """Drop cached state of a folder that disappeared, and of its subfolders"""
+        self._dir_mtimes.pop(directory, None)
+        self._seen.pop(directory, None)
+        for subdir in self._subdirs.pop(directory, []):
+            self._forget(subdir)
+
+    def _found(self, path):
+        directory, name = os.path.split(path)
+        if name not in self._seen.get(directory, ()) and path not in self._pending:
+            self._pending[path] = (None, 0)
+
+    def _mark_seen(self, path):
+        directory, name = os.path.split(path)
+        self._seen.setdefault(directory, set()).add(name)
+
+    def _gone(self, path):
+        """Forget a file that was deleted or moved away"""
+        directory, name = os.path.split(path)
+        seen = self._seen.get(directory)
+        if seen:
+            seen.discard(name)
+            if not seen:
+                del self._seen[directory]
+        self._pending.pop(path, None)
+        self._writing.discard(path)
+
+    def _check_pending(self):
+        """
+        Hand over pending files whose size has been stable for settle_time.
+        Files inotify reports as still open for writing wait ten times longer.
+        """
+        now = time.monotonic()
+        for path, (size, stable_since) in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+
+            if stat.st_size != size:
+                self._pending[path] = (stat.st_size, now)
+            elif now - stable_since >= self.settle_time * (10 if path in self._writing else 1):
+                del self._pending[path]
+                self._writing.discard(path)
+                self._mark_seen(path)
+                try:
+                    self.callback(path)
+                except Exception as e:
+                    print(f"Error processing {path}: {str(e)}")
+
+    def _seed(self):
+        """Mark files already in the folder as seen unless they should be processed"""
+        self._scan(self.path)
+        if not self.process_existing:
+            for path in self._pending:
+                self._mark_seen(path)
+            self._pending.clear()
+
+    def _run_polling(self):
+        self._seed()
+        while not self._stop.wait(self.poll_interval if not self._pending
+                                  else min(self.poll_interval, self.settle_time / 2)):
+            self._scan(self.path, only_changed=True)
+            self._check_pending()
+
+    def _add_watch(self, fd, directory, watches):
+        wd = self._libc.inotify_add_watch(fd, os.fsencode(directory), _WATCH_MASK)
+        if wd >= 0:
+            watches[wd] = directory
+        try:
+            for entry in os.scandir(directory):
+                if entry.is_dir() and not self._skip(entry.name):
+                    self._add_watch(fd, entry.path, watches)
+        except OSError:
+            pass
+
+    def _run_inotify(self):
+        fd = self._libc.inotify_init1(IN_NONBLOCK)
+        if fd < 0:
+            self._libc = None
+            self._run_polling()
+            return
+
+        watches = {}
+        try:
+            self._add_watch(fd, self.path, watches)
+            self._seed()
+            while not self._stop.is_set():
+                # Sleep in select until something happens, waking only to settle pending files
+                timeout = self.settle_time / 2 if self._pending else self.poll_interval
+                readable, _, _ = select.select([fd], [], [], timeout)
+                if readable:
+                    self._read_events(fd, watches)
+                self._check_pending()
+        finally:
+            os.close(fd)
+
+    def _read_events(self, fd, watches):
+        try:
+            data = os.read(fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return
+            raise
+
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length]
+            offset += _EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, rescan everything so no new file is missed
+                self._add_watch(fd, self.path, watches)
+                self._scan(self.path)
+                continue
+
+            directory = watches.get(wd)
+            if mask & IN_IGNORED:
+                watches.pop(wd, None)
+                continue
+            if directory is None or not name:
+                continue
+
+            name = os.fsdecode(name.rstrip(b'\0'))
+            if self._skip(name):
+                continue
+            path = os.path.join(directory, name)
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may land before the watch exists, so list the new folder once
+                    self._add_watch(fd, path, watches)
+                    self._scan(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._forget(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._gone(path)
+            else:
+                self._found(path)
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    self._writing.discard(path)
+                elif path in self._pending:
+                    self._writing.add(path)
@@ -0,0 +1,527 @@
+import os
+import time
+import hashlib
+import threading
+import concurrent.futures
+from array import array
+from collections import deque
+
+from .copy_scheduler import CopyScheduler
+from .file_records import FileRecordStore
+from .folder_watcher import FolderWatcher
+
+
+class DestinationIndex:
+    """
+    Cached listing of destination folders. Each folder is listed once and
+    names are reserved under a lock, so concurrent workers never pick the
+    same target name and repeat conflict checks don't touch the disk.
+    """
+
+    def __init__(self):
+        self._dirs = {}
+        self._mtimes = {}
+        self._pending = set()
+        self._created = set()
+        self._lock = threading.Lock()
+
+    def _names(self, directory):
+        """Names in directory, caller must hold the lock"""
+        names = self._dirs.get(directory)
+        if names is None:
+            try:
+                names = {os.path.normcase(name) for name in os.listdir(directory)}
+            except FileNotFoundError:
+                names = set()
+            self._dirs[directory] = names
+        return names
+
+    def makedirs(self, directory):
+        """os.makedirs that only hits the disk once per folder"""
+        if directory in self._created:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self._created.add(directory)
+
+    def exists(self, filepath):
+        """True if filepath is already on disk (not just reserved)"""
+        directory, filename = os.path.split(filepath)
+        key = os.path.join(directory, os.path.normcase(filename))
+        with self._lock:
+            return os.path.normcase(filename) in self._names(directory) and key not in self._pending
+
+    def reserve(self, filepath):
+        """
+        Reserve filepath, appending _1, _2, ... on naming conflicts.
+        Returns (reserved_path, renamed)
+        """
+        directory, filename = os.path.split(filepath)
+        name, ext = os.path.splitext(filename)
+
+        with self._lock:
+            names = self._names(directory)
+            counter = 0
+            while os.path.normcase(filename) in names:
+                counter += 1
+                filename = f"{name}_{counter}{ext}"
+            names.add(os.path.normcase(filename))
+            self._pending.add(os.path.join(directory, os.path.normcase(filename)))
+
+        return os.path.join(directory, filename), counter > 0
+
+    def commit(self, filepath):
+        """Mark a reserved file as written"""
+        directory, filename = os.path.split(filepath)
+        with self._lock:
+            self._pending.discard(os.path.join(directory, os.path.normcase(filename)))
+
+    def release(self, filepath):
+        """Give up a reservation after a failed copy"""
+        directory, filename = os.path.split(filepath)
+        with self._lock:
+            self._pending.discard(os.path.join(directory, os.path.normcase(filename)))
+            self._dirs.get(directory, set()).discard(os.path.normcase(filename))
+
+    def snapshot(self):
+        """Remember folder modification times, e.g. at the end of a job"""
+        with self._lock:
+            for directory in self._dirs:
+                try:
+                    self._mtimes[directory] = os.stat(directory).st_mtime_ns
+                except OSError:
+                    self._mtimes.pop(directory, None)
+
+    def drop_stale(self):
+        """Forget listings of folders changed by someone else since the last snapshot"""
+        with self._lock:
+            for directory in list(self._dirs):
+                try:
+                    mtime = os.stat(directory).st_mtime_ns
+                except OSError:
+                    mtime = None
+                if mtime is None or mtime != self._mtimes.get(directory):
+                    del self._dirs[directory]
+                    self._mtimes.pop(directory, None)
+                    self._created.discard(directory)
+
+    def invalidate(self, directory=None):
+        """Forget cached listings, e.g. after the destination changed outside the app"""
+        with self._lock:
+            if directory is None:
+                self._dirs.clear()
+                self._created.clear()
+            else:
+                self._dirs.pop(directory, None)
+                self._created.discard(directory)
+
+
+class _Claim:
+    """A file registered with DedupState and whether its copy succeeded"""
+    __slots__ = ('path', 'key', 'done', 'ok')
+
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+        self.done = threading.Event()
+        self.ok = False
+
+
+class DedupState:
+    """
+    Duplicate and name reservation state shared by every source of a job,
+    so the same photo or movie found on two cards is only copied once.
+    A file is a duplicate of another when both have the same filename,
+    the same size and the same content. Empty files and files that are
+    neither photos nor movies are always copied.
+    After plan(), only files whose size and name collide with another file
+    of the job are remembered, everything else is copied without a claim.
+    With max_finished_claims, only that many copied files are remembered,
+    e.g. for a watch job that has no store to plan from.
+    """
+
+    def __init__(self, index=None, digests=None, max_cached_digests=200000,
+                 max_finished_claims=None):
+        self.index = index or DestinationIndex()
+        self._claims = {}
+        self.max_finished_claims = max_finished_claims
+        self._finished = deque()
+        # Bitmap of (size, name) keys seen more than once, None until plan()
+        self._colliding = None
+        self._plan_bits = 0
+        # Content digests keyed by (path, size, mtime), may be shared between jobs
+        self._digests = digests if digests is not None else {}
+        self.max_cached_digests = max_cached_digests
+        self._lock = threading.Lock()
+
+    def file_digest(self, filepath):
+        """Content hash of a file, cached by path, size and modification time"""
+        stat = os.stat(filepath)
+        key = (filepath, stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(key)
+        if digest is None:
+            h = hashlib.blake2b(digest_size=16)
+            with open(filepath, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            if len(self._digests) >= self.max_cached_digests:
+                self._digests.clear()
+            self._digests[key] = digest
+        return digest
+
+    def _key(self, size, filename):
+        return size, os.path.normcase(filename)
+
+    def plan(self, store):
+        """
+        Find which files of a FileRecordStore may have a duplicate.
+        Keys are hashed into two bitmaps sized to the store, so this costs a
+        few bytes per file however many files share a size and name. A hash
+        collision only means a file is claimed that didn't need to be.
+        """
+        bits = max(len(store) * 32, 1024)
+        seen = bytearray(bits // 8 + 1)
+        colliding = bytearray(bits // 8 + 1)
+        tracked = (FileRecordStore.KINDS.index('photo'), FileRecordStore.KINDS.index('movie'))
+        for index in range(len(store)):
+            size = store.sizes[index]
+            if not size or store.kinds[index] not in tracked:
+                continue
+            bit = hash(self._key(size, store.name(index))) % bits
+            if seen[bit >> 3] & (1 << (bit & 7)):
+                colliding[bit >> 3] |= 1 << (bit & 7)
+            else:
+                seen[bit >> 3] |= 1 << (bit & 7)
+        self._plan_bits = bits
+        self._colliding = colliding
+
+    def _may_collide(self, key):
+        if self._colliding is None:
+            return True
+        bit = hash(key) % self._plan_bits
+        return bool(self._colliding[bit >> 3] & (1 << (bit & 7)))
+
+    def claim(self, src_path, kind, size=None):
+        """
+        Register src_path as part of the job.
+        Returns False if it duplicates a file that was copied, otherwise a
+        ticket (None for files that aren't tracked) to pass to finish().
+        Only files whose size and name match are ever hashed. A duplicate
+        waits for the earlier copy, and is copied itself if that one failed.
+        """
+        if kind not in ('photo', 'movie'):
+            return None
+        if size is None:
+            size = os.path.getsize(src_path)
+        if not size:
+            return None
+
+        key = self._key(size, os.path.basename(src_path))
+        if not self._may_collide(key):
+            return None
+        ticket = _Claim(src_path, key)
+        with self._lock:
+            claims = self._claims.setdefault(key, [])
+            candidates = list(claims)
+            claims.append(ticket)
+
+        if not candidates:
+            return ticket
+
+        try:
+            digest = self.file_digest(src_path)
+            for other in candidates:
+                try:
+                    if self.file_digest(other.path) != digest:
+                        continue
+                except OSError:
+                    continue
+                other.done.wait()
+                if other.ok:
+                    with self._lock:
+                        self._drop(ticket)
+                    return False
+        except Exception:
+            self.finish(ticket, False)
+            raise
+        return ticket
+
+    def finish(self, ticket, ok):
+        """Record the outcome of a claimed file, dropping it if the copy failed"""
+        if ticket is None:
+            return
+        ticket.ok = ok
+        with self._lock:
+            if not ok:
+                self._drop(ticket)
+            elif self.max_finished_claims is not None:
+                self._finished.append(ticket)
+                while len(self._finished) > self.max_finished_claims:
+                    self._drop(self._finished.popleft())
+        ticket.done.set()
+
+    def _drop(self, ticket):
+        """Forget a claim, caller must hold the lock"""
+        claims = self._claims.get(ticket.key)
+        if claims and ticket in claims:
+            claims.remove(ticket)
+            if not claims:
+                del self._claims[ticket.key]
+
+
+class ImportJob:
+    """
+    Import of one or more source roots into a destination folder.
+    Every source device gets its own reader limit in each copy lane, while
+    all sources share one CopyScheduler for writing and one DedupState.
+    """
+
+    def __init__(self, dest_root, photo_handler, scheduler=None, dedup=None,
+                 reader_workers=2, large_reader_workers=1):
+        self.dest_root = dest_root
+        self.photo_handler = photo_handler
+        self.scheduler = scheduler or CopyScheduler()
+        self.dedup = dedup or DedupState()
+        self.reader_workers = reader_workers
+        self.large_reader_workers = large_reader_workers
+        self.sources = []
+        self.cancelled = False
+        self._readers = {}
+        self._source_devices = {}
+
+    def add_source(self, path, reader_workers=None, large_reader_workers=None):
+        """
+        Add a source root. Roots on the same device share one reader limit
+        per lane, so a movie being read never takes a photo's slot.
+        """
+        try:
+            device = os.stat(path).st_dev
+        except OSError:
+            device = path
+
+        if (device, self.scheduler.small_lane.name) not in self._readers:
+            self._readers[(device, self.scheduler.small_lane.name)] = threading.BoundedSemaphore(
+                reader_workers or self.reader_workers)
+            self._readers[(device, self.scheduler.large_lane.name)] = threading.BoundedSemaphore(
+                large_reader_workers or self.large_reader_workers)
+        self._source_devices[os.path.normcase(os.path.abspath(path))] = device
+        self.sources.append(path)
+
+    def _source_root(self, path):
+        """Source root containing path, None if it isn't below any source"""
+        path = os.path.normcase(os.path.abspath(path))
+        for root in self._source_devices:
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return root
+        return None
+
+    def _reader_for(self, src_path, lane):
+        """Reader semaphore of the source root containing src_path, for a copy lane"""
+        if lane is None:
+            return None
+        root = self._source_root(src_path)
+        if root is None:
+            return None
+        return self._readers[(self._source_devices[root], lane.name)]
+
+    def _read_limited(self, src_path, func, *args):
+        """
+        Run func(src_path, *args) holding the reader slot of its source
+        device, so hashing, EXIF reads and the copy all count as reads
+        """
+        reader = self._reader_for(src_path, self.scheduler.current_lane())
+        if reader is None:
+            return func(src_path, *args)
+        with reader:
+            return func(src_path, *args)
+
+    def classify(self, filename):
+        """Return 'photo', 'movie' or 'other' for a filename"""
+        if self.photo_handler.is_image_file(filename):
+            return 'photo'
+        if self.photo_handler.is_movie_file(filename):
+            return 'movie'
+        return 'other'
+
+    def collect_source(self, path, store):
+        """Add every file below path to a FileRecordStore, skipping hidden and system entries"""
+        pending = [path]
+        while pending:
+            try:
+                entries = list(os.scandir(pending.pop()))
+            except OSError:
+                continue
+
+            for entry in entries:
+                if entry.name.startswith('$') or entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir():
+                        pending.append(entry.path)
+                    elif entry.is_file():
+                        store.add_entry(entry, self.classify(entry.name))
+                except OSError:
+                    continue
+        return store
+
+    def store_items(self, store, status='pending', lane=None):
+        """
+        Yield (kind, path, index, size) for the records of a FileRecordStore
+        with status, taking one file from each source root in turn so the
+        readers of every source device are busy at the same time, whatever
+        order the sources were scanned in. With lane, only the records
+        copied in that lane of the scheduler.
+        """
+        code = store.STATUSES.index(status)
+        groups = {}
+        dir_roots = {}
+        for index in range(len(store)):
+            if store.statuses[index] != code:
+                continue
+            if lane is not None and self.scheduler.lane_for(store.sizes[index]) is not lane:
+                continue
+            dir_id = store.dir_ids[index]
+            if dir_id not in dir_roots:
+                dir_roots[dir_id] = self._source_root(store.directory(index))
+            groups.setdefault(dir_roots[dir_id], array('I')).append(index)
+
+        cursors = [iter(indexes) for indexes in groups.values()]
+        while cursors:
+            for cursor in list(cursors):
+                index = next(cursor, None)
+                if index is None:
+                    cursors.remove(cursor)
+                elif store.statuses[index] == code:
+                    yield store.kind(index), store.path(index), index, store.sizes[index]
+
+    def submit(self, kind, src_path, tag=None, size=None):
+        """Queue a file of kind 'photo', 'movie' or 'other', size is looked up if not given"""
+        if kind == 'photo':
+            return self.scheduler.submit(self._read_limited, src_path, self.process_photo, tag,
+                                         size=size)
+        folder_name = "Movies" if kind == 'movie' else "Other"
+        return self.scheduler.submit(self._read_limited, src_path, self.process_other_file,
+                                     tag, folder_name, size=size)
+
+    def run(self, store, on_result=None, max_in_flight=256, max_large_in_flight=16,
+            on_progress=None, progress_interval=0.5):
+        """
+        Process the pending records of a FileRecordStore, calling
+        on_result((status, path, index)) as each file finishes.
+        on_progress() is called every progress_interval seconds, so byte
+        progress keeps moving while only large files are copying.
+        Each lane is fed from its own pass over the store as its workers
+        free up, with at most max_in_flight small and max_large_in_flight
+        large files holding a Future at any time. A full large lane never
+        keeps photos from being submitted.
+        """
+        lanes = [(self.store_items(store, lane=self.scheduler.small_lane), set(), max_in_flight),
+                 (self.store_items(store, lane=self.scheduler.large_lane), set(), max_large_in_flight)]
+        last_progress = time.monotonic()
+        try:
+            while not self.cancelled:
+                for items, in_flight, limit in lanes:
+                    while len(in_flight) < limit:
+                        item = next(items, None)
+                        if item is None:
+                            break
+                        kind, src_path, index, size = item
+                        in_flight.add(self.submit(kind, src_path, index, size))
+
+                running = set().union(*(in_flight for _, in_flight, _ in lanes))
+                if not running:
+                    break
+
+                done, _ = concurrent.futures.wait(running,
+                                                  timeout=progress_interval if on_progress else None,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                if on_progress and time.monotonic() - last_progress >= progress_interval:
+                    last_progress = time.monotonic()
+                    on_progress()
+                for _, in_flight, _ in lanes:
+                    in_flight -= done
+                for future in done:
+                    if future.cancelled():
+                        continue
+                    result = future.result()
+                    if result and on_result:
+                        on_result(result)
+        finally:
+            self.scheduler.shutdown(wait=False, cancel_futures=self.cancelled)
+
+    def watch(self, folder, on_result=None, max_remembered=10000, **watcher_options):
+        """
+        Start a FolderWatcher that sends each new file in folder through this
+        job. Duplicates are found among the last max_remembered files copied.
+        """
+        def on_done(future):
+            if not future.cancelled() and future.result() and on_result:
+                on_result(future.result())
+
+        def submit(src_path):
+            if not self.cancelled:
+                self.submit(self.classify(os.path.basename(src_path)), src_path).add_done_callback(on_done)
+
+        self.dedup.max_finished_claims = max_remembered
+        self.add_source(folder)
+        watcher = FolderWatcher(folder, submit, **watcher_options)
+        watcher.start()
+        return watcher
+
+    def cancel(self):
+        """Stop the job, queued files return None without being copied"""
+        self.cancelled = True
+
+    def _copy_reserved(self, src_path, dest_file):
+        """Reserve a name for dest_file and copy. Returns the copy status"""
+        dest_file, renamed = self.dedup.index.reserve(dest_file)
+        try:
+            self.scheduler.copy_file(src_path, dest_file)
+        except Exception:
+            self.dedup.index.release(dest_file)
+            raise
+        self.dedup.index.commit(dest_file)
+        return 'renamed' if renamed else 'copied'
+
+    def process_photo(self, src_path, tag=None):
+        """Copy a photo into a year/month folder based on the date it was taken"""
+        if self.cancelled:
+            return None
+        ticket = None
+        try:
+            ticket = self.dedup.claim(src_path, 'photo')
+            if ticket is False:
+                return ('duplicate', src_path, tag)
+
+            photo_date = self.photo_handler.get_photo_date(src_path)
+            month_path = os.path.join(self.dest_root, str(photo_date.year), f"{photo_date.month:02d}")
+            self.dedup.index.makedirs(month_path)
+
+            dest_file = os.path.join(month_path, os.path.basename(src_path))
+            if self.dedup.index.exists(dest_file) and self.photo_handler.are_images_same(src_path, dest_file):
+                status = 'duplicate'
+            else:
+                status = self._copy_reserved(src_path, dest_file)
+        except Exception:
+            status = 'error'
+        self.dedup.finish(ticket, status != 'error')
+        return (status, src_path, tag)
+
+    def process_other_file(self, src_path, tag=None, folder_name="Other"):
+        """Copy a movie or other file into its folder"""
+        if self.cancelled:
+            return None
+        ticket = None
+        try:
+            ticket = self.dedup.claim(src_path, 'movie' if folder_name == "Movies" else 'other')
+            if ticket is False:
+                return ('duplicate', src_path, tag)
+
+            dest_folder = os.path.join(self.dest_root, folder_name)
+            self.dedup.index.makedirs(dest_folder)
+            dest_file = os.path.join(dest_folder, os.path.basename(src_path))
+            status = self._copy_reserved(src_path, dest_file)
+        except Exception:
+            status = 'error'
+        self.dedup.finish(ticket, status != 'error')
+        return (status, src_path, tag)
@@ -0,0 +1,481 @@
+import os
+import hmac
+import json
+import queue
+import secrets
+import threading
+import http.client
+import concurrent.futures
+from collections import deque
+from itertools import islice
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .copy_scheduler import CopyScheduler
+from .file_records import FileRecordStore
+from .import_job import ImportJob, DedupState, DestinationIndex
+from .photo_operations import PhotoHandler
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+TOKEN_HEADER = 'X-PhotoMover-Token'
+LOOPBACK_HOSTS = {'127.0.0.1', 'localhost', '::1'}
+
+
+def token_path():
+    """Per-user file holding the token clients must send to the service"""
+    return os.path.join(os.path.expanduser('~'), '.photomover', 'service_token')
+
+
+def create_token():
+    """Write a fresh token only the current user can read and return it"""
+    path = token_path()
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    token = secrets.token_urlsafe(32)
+    if os.path.exists(path):
+        os.remove(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(token)
+    return token
+
+
+def read_token():
+    try:
+        with open(token_path()) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _hostname(value):
+    """Host part of a Host header or Origin, without scheme and port"""
+    value = value.split('://', 1)[-1].rstrip('/')
+    if value.startswith('['):
+        return value[1:value.find(']')]
+    return value.rsplit(':', 1)[0] if value.count(':') == 1 else value
+
+
+class ServiceJob:
+    """
+    A queued import and its most recent progress events. Only the last
+    max_events are kept, a client that falls further behind skips ahead.
+    The final status of every file stays available from results() until
+    the job is pruned.
+    """
+
+    def __init__(self, job_id, destination, sources=None, files=None, max_events=1000):
+        self.id = job_id
+        self.destination = destination
+        self.sources = sources or []
+        self.files = files
+        self.state = 'queued'
+        self.cancelled = False
+        self.import_job = None
+        self.store = None
+        self.events = deque(maxlen=max_events)
+        # Number of events ever added, the first kept event is number total - len(events)
+        self.total_events = 0
+        self._cond = threading.Condition()
+
+    def add_event(self, event):
+        with self._cond:
+            self.events.append(event)
+            self.total_events += 1
+            self._cond.notify_all()
+
+    def finish(self, state):
+        with self._cond:
+            self.state = state
+            self.events.append({'type': 'done', 'state': state})
+            self.total_events += 1
+            self._cond.notify_all()
+
+    def wait_events(self, since, timeout=1.0):
+        """
+        Return (next, events) with the kept events numbered since or later,
+        waiting up to timeout for new ones. Pass next as since to continue.
+        """
+        with self._cond:
+            if self.total_events <= since and self.state not in ('complete', 'cancelled', 'failed'):
+                self._cond.wait(timeout)
+            first = self.total_events - len(self.events)
+            return self.total_events, list(islice(self.events, max(since - first, 0), None))
+
+    def iter_events(self):
+        """Yield the events of the job, blocking until it is done"""
+        sent = 0
+        while True:
+            sent, events = self.wait_events(sent)
+            yield from events
+            if events and events[-1]['type'] == 'done':
+                return
+
+    def results(self):
+        """Yield (path, status) for every file the job has processed so far"""
+        store = self.store
+        if store is None:
+            return
+        pending = store.STATUSES.index('pending')
+        for index in range(len(store)):
+            if store.statuses[index] != pending:
+                yield store.path(index), store.status(index)
+
+    def summary(self):
+        return {'id': self.id, 'state': self.state, 'destination': self.destination,
+                'sources': self.sources}
+
+
+class IngestService:
+    """
+    Long running import engine. Destination listings, file digests and image
+    hashes stay in memory between jobs, so repeat imports skip the warm-up a
+    fresh process would need. Jobs are queued and run one at a time.
+    """
+
+    def __init__(self, photo_handler=None, drive_manager=None, max_finished_jobs=50):
+        self.photo_handler = photo_handler or PhotoHandler()
+        self.drive_manager = drive_manager
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs = {}
+        self._indexes = {}
+        self._digests = {}
+        self._drives = None
+        self._next_id = 1
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run_jobs, daemon=True)
+        self._worker.start()
+
+    def index_for(self, destination):
+        """Warm DestinationIndex for a destination folder"""
+        key = os.path.normcase(os.path.abspath(destination))
+        with self._lock:
+            if key not in self._indexes:
+                self._indexes[key] = DestinationIndex()
+            return self._indexes[key]
+
+    def get_drives(self, refresh=False):
+        """Cached drive inventory"""
+        if self.drive_manager is None:
+            return []
+        if self._drives is None or refresh:
+            self._drives = self.drive_manager.get_available_drives()
+        return self._drives
+
+    def submit(self, destination, sources=None, files=None):
+        """Queue a job. files is an optional list of (kind, path) pairs"""
+        with self._lock:
+            job = ServiceJob(self._next_id, destination, sources, files)
+            self.jobs[job.id] = job
+            self._next_id += 1
+            self._prune_jobs()
+        self._queue.put(job)
+        return job
+
+    def summaries(self):
+        with self._lock:
+            return [job.summary() for job in self.jobs.values()]
+
+    def _prune_jobs(self):
+        """Forget the oldest finished jobs, caller must hold the lock"""
+        finished = [job_id for job_id, job in self.jobs.items()
+                    if job.state in ('complete', 'cancelled', 'failed')]
+        for job_id in finished[:max(len(finished) - self.max_finished_jobs, 0)]:
+            del self.jobs[job_id]
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            # A job between being picked up and getting its ImportJob sees the flag in _run
+            job.cancelled = True
+            if job.state == 'queued':
+                job.finish('cancelled')
+            elif job.import_job:
+                job.import_job.cancel()
+        return True
+
+    def _run_jobs(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.state != 'queued':
+                    continue
+                job.state = 'running'
+            try:
+                self._run(job)
+            except Exception as e:
+                job.add_event({'type': 'error', 'message': str(e)})
+                job.finish('failed')
+
+    def _run(self, job):
+        index = self.index_for(job.destination)
+        index.drop_stale()
+        dedup = DedupState(index, self._digests)
+        import_job = ImportJob(job.destination, self.photo_handler,
+                               scheduler=CopyScheduler(), dedup=dedup)
+        for source in job.sources:
+            import_job.add_source(source)
+        with self._lock:
+            job.import_job = import_job
+            if job.cancelled:
+                import_job.cancel()
+
+        store = job.store = FileRecordStore()
+        if job.files is not None:
+            for kind, path in job.files:
+                try:
+                    store.add(path, kind, os.path.getsize(path))
+                except OSError:
+                    store.add(path, kind)
+            job.files = None
+        elif job.sources:
+            # Scan every source at the same time, store_items() interleaves them again
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(job.sources)) as executor:
+                list(executor.map(lambda source: import_job.collect_source(source, store), job.sources))
+        dedup.plan(store)
+        job.add_event({'type': 'started', 'files_total': len(store)})
+
+        def on_result(result):
+            status, src_path, index = result
+            store.set_status(index, status)
+            files_done, _, bytes_done, _ = import_job.scheduler.progress()
+            job.add_event({'type': 'result', 'status': status, 'path': src_path,
+                           'files_done': files_done, 'files_total': len(store),
+                           'bytes_done': bytes_done, 'bytes_total': store.total_bytes})
+
+        def on_progress():
+            files_done, _, bytes_done, _ = import_job.scheduler.progress()
+            job.add_event({'type': 'progress', 'files_done': files_done, 'files_total': len(store),
+                           'bytes_done': bytes_done, 'bytes_total': store.total_bytes})
+
+        try:
+            import_job.run(store, on_result, on_progress=on_progress)
+        finally:
+            index.snapshot()
+        job.finish('cancelled' if import_job.cancelled else 'complete')
+
+    def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Serve the HTTP API until interrupted"""
+        server = ThreadingHTTPServer((host, port), _make_handler(self))
+        # Only a service that got the port may replace the token of the one running before
+        server.token = create_token()
+        server.daemon_threads = True
+        print(f"PhotoMover service listening on http://{host}:{port}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+
+def _make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        """
+        Every request needs the token from token_path() in the
+        X-PhotoMover-Token header, and POST bodies must be application/json.
+        Requests with a non-loopback Host or a browser Origin are refused.
+
+        GET  /status              queued and finished jobs
+        GET  /drives              cached drive inventory
+        POST /jobs                {"destination": ..., "sources": [...], "files": [[kind, path], ...]}
+        GET  /jobs/<id>/events    newline delimited JSON events until the job is done
+        GET  /jobs/<id>/results   newline delimited {"path": ..., "status": ...} of processed files
+        POST /jobs/<id>/cancel
+        """
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, data, status=200):
+            body = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _job_from_path(self):
+            parts = self.path.strip('/').split('/')
+            try:
+                return service.jobs.get(int(parts[1])), parts[2] if len(parts) > 2 else None
+            except (IndexError, ValueError):
+                return None, None
+
+        def _authorized(self):
+            """Refuse requests that could come from a web page or another user"""
+            host = self.headers.get('Host')
+            origin = self.headers.get('Origin')
+            if not host or _hostname(host) not in LOOPBACK_HOSTS:
+                self._send_json({'error': 'forbidden host'}, 403)
+                return False
+            if origin is not None and (_hostname(origin) not in LOOPBACK_HOSTS
+                                       or _hostname(origin) != _hostname(host)):
+                self._send_json({'error': 'forbidden origin'}, 403)
+                return False
+            if not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ''), self.server.token):
+                self._send_json({'error': 'invalid token'}, 401)
+                return False
+            return True
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            if self.path == '/status':
+                self._send_json({'jobs': service.summaries()})
+            elif self.path == '/drives':
+                self._send_json({'drives': service.get_drives()})
+            elif self.path.startswith('/jobs/'):
+                job, action = self._job_from_path()
+                if job is None or action not in ('events', 'results'):
+                    self._send_json({'error': 'not found'}, 404)
+                    return
+                if action == 'events':
+                    self._stream(job.iter_events())
+                else:
+                    self._stream({'path': path, 'status': status} for path, status in job.results())
+            else:
+                self._send_json({'error': 'not found'}, 404)
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            if self.headers.get('Content-Type', '').split(';')[0].strip() != 'application/json':
+                self._send_json({'error': 'Content-Type must be application/json'}, 415)
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                data = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._send_json({'error': 'invalid JSON'}, 400)
+                return
+
+            if self.path == '/jobs':
+                if not data.get('destination') or not (data.get('sources') or data.get('files')):
+                    self._send_json({'error': 'destination and sources or files are required'}, 400)
+                    return
+                job = service.submit(data['destination'], data.get('sources'), data.get('files'))
+                self._send_json(job.summary(), 201)
+            elif self.path.startswith('/jobs/'):
+                job, action = self._job_from_path()
+                if job is None or action != 'cancel':
+                    self._send_json({'error': 'not found'}, 404)
+                    return
+                service.cancel(job.id)
+                self._send_json(job.summary())
+            else:
+                self._send_json({'error': 'not found'}, 404)
+
+        def _stream(self, items):
+            # Body is delimited by closing the connection (HTTP/1.0)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            for item in items:
+                self.wfile.write(json.dumps(item).encode('utf-8') + b'\n')
+                self.wfile.flush()
+
+    return Handler
+
+
+class IngestClient:
+    """Client for a running IngestService, used by the GUI and the command line"""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=5):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _headers(self):
+        return {TOKEN_HEADER: read_token() or ''}
+
+    def _request(self, method, path, data=None, timeout=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout or self.timeout)
+        headers = self._headers()
+        body = None
+        if method == 'POST':
+            body = json.dumps(data or {}).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        conn.request(method, path, body=body, headers=headers)
+        return conn, conn.getresponse()
+
+    def _json(self, method, path, data=None, timeout=None):
+        conn, response = self._request(method, path, data, timeout)
+        try:
+            result = json.loads(response.read())
+            if response.status >= 400:
+                raise RuntimeError(result.get('error', f"HTTP {response.status}"))
+            return result
+        finally:
+            conn.close()
+
+    def is_running(self):
+        """True if a service answers on host:port and accepts our token"""
+        if read_token() is None:
+            return False
+        try:
+            self._json('GET', '/status', timeout=0.5)
+            return True
+        except (OSError, RuntimeError, ValueError):
+            return False
+
+    def status(self):
+        return self._json('GET', '/status')
+
+    def submit(self, destination, sources=None, files=None):
+        """Queue a job and return its id"""
+        data = {'destination': destination, 'sources': sources or []}
+        if files is not None:
+            data['files'] = [list(item) for item in files]
+        return self._json('POST', '/jobs', data)['id']
+
+    def submit_job(self, destination, sources=None, files=None):
+        """Queue a job and return a RemoteJob handle"""
+        return RemoteJob(self, self.submit(destination, sources, files))
+
+    def cancel(self, job_id):
+        return self._json('POST', f'/jobs/{job_id}/cancel')
+
+    def _stream(self, path):
+        # No timeout, a job can go quiet while a large file copies
+        conn = http.client.HTTPConnection(self.host, self.port)
+        conn.request('GET', path, headers=self._headers())
+        response = conn.getresponse()
+        try:
+            if response.status >= 400:
+                raise RuntimeError(json.loads(response.read()).get('error', f"HTTP {response.status}"))
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            conn.close()
+
+    def events(self, job_id):
+        """Yield progress events of a job until it is done"""
+        return self._stream(f'/jobs/{job_id}/events')
+
+    def results(self, job_id):
+        """Yield {"path": ..., "status": ...} for every file the job has processed"""
+        return self._stream(f'/jobs/{job_id}/results')
+
+
+class RemoteJob:
+    """Handle on a job running in the service, cancelled like an ImportJob"""
+
+    def __init__(self, client, job_id):
+        self.client = client
+        self.id = job_id
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+        try:
+            self.client.cancel(self.id)
+        except (OSError, RuntimeError):
+            pass
+
+    def events(self):
+        return self.client.events(self.id)
+
+    def results(self):
+        return self.client.results(self.id)
@@ -6,6 +6,9 @@ import imagehash
 class PhotoHandler:
     def __init__(self):
         self.supported_formats = {'.jpg', '.jpeg', '.png', '.gif', '.bmp'}
+        # Rotated image hashes keyed by (path, size, mtime), kept warm between jobs
+        self._hash_cache = {}
+        self.max_cached_hashes = 200000
         
     def is_image_file(self, filename):
         """Check if file is an image based on extension."""
@@ -54,21 +57,12 @@ class PhotoHandler:
             return False
         
         try:
-            # Open both images
-            img1 = Image.open(path1)
-            img2 = Image.open(path2)
-            
-            # Convert images to same mode if different
-            if img1.mode != img2.mode:
-                img1 = img1.convert(img2.mode)
-            
             # Calculate hash of first image
-            hash1 = imagehash.average_hash(img1)
+            hash1 = self._rotated_hash(path1, 0)
             
             # Check original and rotated versions of second image
             for angle in [0, 90, 180, 270]:
-                rotated_img2 = img2.rotate(angle, expand=True)
-                hash2 = imagehash.average_hash(rotated_img2)
+                hash2 = self._rotated_hash(path2, angle)
             
                 # Compare hashes - if difference is small enough, consider images same
                 if hash1 - hash2 < 5:  # Threshold can be adjusted
@@ -80,6 +74,19 @@ class PhotoHandler:
             print(f"Error comparing images: {str(e)}")
             return False
 
+    def _rotated_hash(self, filepath, angle):
+        """Average hash of an image rotated by angle, cached until the file changes"""
+        stat = os.stat(filepath)
+        key = (filepath, stat.st_size, stat.st_mtime_ns, angle)
+        image_hash = self._hash_cache.get(key)
+        if image_hash is None:
+            with Image.open(filepath) as img:
+                image_hash = imagehash.average_hash(img.rotate(angle, expand=True) if angle else img)
+            if len(self._hash_cache) >= self.max_cached_hashes:
+                self._hash_cache.clear()
+            self._hash_cache[key] = image_hash
+        return image_hash
+
     def get_photo_date(self, filepath):
         """Get the date the photo was taken from EXIF data, or file modification date as fallback"""
         try: